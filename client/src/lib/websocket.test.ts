@@ -86,21 +86,30 @@ describe('WebSocket client', () => {
     })
   })
 
-  it('calls onRequestAwarded on request_awarded message', () => {
+  it('calls onRequestAwarded and onBalanceUpdate on exercise_result message', () => {
     const onRequestAwarded = vi.fn()
-    client = createWebSocketClient('ws://test', { onRequestAwarded })
+    const onBalanceUpdate = vi.fn()
+    client = createWebSocketClient('ws://test', { onRequestAwarded, onBalanceUpdate })
     getMockWs().simulateOpen()
     getMockWs().simulateMessage({
-      type: 'request_awarded',
+      type: 'exercise_result',
       exercise: 'jumping_jacks',
       requests: 1,
       message: 'Nice! +1 request',
+      requests_available: 3,
+      requests_earned: 4,
+      requests_spent: 1,
     })
     expect(onRequestAwarded).toHaveBeenCalledWith({
       exercise: 'jumping_jacks',
       requests: 1,
       message: 'Nice! +1 request',
     })
+    expect(onBalanceUpdate).toHaveBeenCalledWith({
+      requestsAvailable: 3,
+      requestsEarned: 4,
+      requestsSpent: 1,
+    })
   })
 
   it('calls onError on error message', () => {
@@ -63,12 +63,17 @@ export function createWebSocketClient(
         })
         break
 
-      case 'request_awarded':
+      case 'exercise_result':
         handlers.onRequestAwarded?.({
           exercise: data.exercise ?? '',
           requests: data.requests ?? 0,
           message: data.message ?? '',
         })
+        handlers.onBalanceUpdate?.({
+          requestsAvailable: data.requests_available ?? 0,
+          requestsEarned: data.requests_earned ?? 0,
+          requestsSpent: data.requests_spent ?? 0,
+        })
         break
 
       case 'error':
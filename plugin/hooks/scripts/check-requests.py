@@ -4,24 +4,87 @@ Claude Code hook script that checks if the user has available requests.
 If not, blocks the message and instructs them to exercise.
 """
 
+import http.client
 import json
+import os
+import socket
 import sys
-import urllib.request
-import urllib.error
+from pathlib import Path
 
-SERVER_URL = "http://localhost:8000"
+SERVER_HOST = "localhost"
+SERVER_PORT = 8000
 CLIENT_URL = "http://localhost:5173"
+TIMEOUT = 5
 
 
-def main() -> None:
+def default_socket_path() -> Path:
+    """Locate the server's Unix socket in its fixed per-user location.
+
+    The server also listens on this socket, and the hook runs on the same
+    machine, so talking over it skips TCP setup entirely. The path must
+    match server.main.default_socket_path(); it does not depend on where
+    the plugin is installed.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    base = Path(runtime_dir) if runtime_dir else Path.home() / ".vibercizing"
+    return base / "vibercizing.sock"
+
+
+SOCKET_PATH = Path(os.environ.get("VIBERCIZING_SOCKET") or default_socket_path())
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects over a Unix domain socket."""
+
+    def __init__(self, path: Path, timeout: float) -> None:
+        super().__init__(SERVER_HOST, timeout=timeout)
+        self.socket_path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def deduct(conn: http.client.HTTPConnection) -> dict:
+    """POST /api/deduct over conn and return the decoded response."""
     try:
-        req = urllib.request.Request(
-            f"{SERVER_URL}/api/deduct",
-            method="POST",
-            headers={"Content-Type": "application/json"},
+        conn.request(
+            "POST",
+            "/api/deduct",
+            headers={"Content-Type": "application/json", "Content-Length": "0"},
         )
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            result = json.load(resp)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def request_deduct() -> dict:
+    """Deduct a request, preferring the Unix socket and falling back to TCP."""
+    if hasattr(socket, "AF_UNIX") and SOCKET_PATH.exists():
+        conn = UnixHTTPConnection(SOCKET_PATH, timeout=TIMEOUT)
+        try:
+            conn.connect()
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Stale socket file; the server may still be reachable over TCP.
+            # Only connect failures fall back: once the POST is sent, a
+            # retry would deduct a second request.
+            conn.close()
+        else:
+            return deduct(conn)
+    return deduct(
+        http.client.HTTPConnection(SERVER_HOST, SERVER_PORT, timeout=TIMEOUT)
+    )
+
+
+def main() -> None:
+    try:
+        result = request_deduct()
 
         if result.get("success"):
             # Request deducted successfully, allow the message
@@ -40,7 +103,7 @@ def main() -> None:
             print(json.dumps(output))
             sys.exit(0)
 
-    except urllib.error.URLError:
+    except OSError:
         # Server not running
         output = {
             "decision": "block",
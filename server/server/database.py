@@ -1,11 +1,18 @@
 """Database layer using aiosqlite."""
 
-from datetime import datetime
+import asyncio
+import itertools
+import logging
+import sys
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, Final
 
 import aiosqlite
+import orjson
 
-from server.models import Balance, ExerciseLogEntry, RequestLogEntry
+from server.models import Balance
 
 
 SCHEMA = """
@@ -30,144 +37,442 @@ CREATE TABLE IF NOT EXISTS request_log (
     blocked BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE INDEX IF NOT EXISTS ix_exercise_log_created
+    ON exercise_log (created_at DESC);
+
+CREATE INDEX IF NOT EXISTS ix_request_log_created
+    ON request_log (created_at DESC);
+"""
+
+JOURNAL_PRAGMAS = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+"""
+
+CONNECTION_PRAGMAS = """
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -64000;
 """
 
+if sys.platform != "win32":
+    # Serve reads from a memory map instead of pread(); Windows mmap differs
+    CONNECTION_PRAGMAS += "PRAGMA mmap_size = 268435456;\n"
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the compiled plan on every call.
+_SQL_INIT_BALANCE: Final = (
+    "INSERT OR IGNORE INTO balance (id, requests_earned, requests_spent) "
+    "VALUES (1, 0, 0)"
+)
+_SQL_GET_BALANCE: Final = (
+    "SELECT requests_earned, requests_spent FROM balance WHERE id = 1"
+)
+_SQL_CREDIT: Final = (
+    "UPDATE balance SET requests_earned = requests_earned + ?, "
+    "updated_at = CURRENT_TIMESTAMP WHERE id = 1 "
+    "RETURNING requests_earned, requests_spent"
+)
+_SQL_DEDUCT: Final = (
+    "UPDATE balance SET requests_spent = requests_spent + 1, "
+    "updated_at = CURRENT_TIMESTAMP "
+    "WHERE id = 1 AND requests_earned > requests_spent "
+    "RETURNING requests_earned, requests_spent"
+)
+_SQL_LOG_REQUEST: Final = (
+    "INSERT INTO request_log (requests_deducted, blocked) VALUES (?, ?)"
+)
+_SQL_LOG_EXERCISE: Final = (
+    "INSERT INTO exercise_log (exercise_type, reps_completed, requests_awarded) "
+    "VALUES (?, ?, ?)"
+)
+# History rows are returned as-is, so timestamps are formatted as ISO 8601 here
+_SQL_EXERCISE_HISTORY: Final = (
+    "SELECT id, exercise_type, reps_completed, requests_awarded, "
+    "strftime('%Y-%m-%dT%H:%M:%S', created_at) AS created_at "
+    "FROM exercise_log ORDER BY exercise_log.created_at DESC LIMIT ? OFFSET ?"
+)
+_SQL_REQUEST_HISTORY: Final = (
+    "SELECT id, requests_deducted, blocked, "
+    "strftime('%Y-%m-%dT%H:%M:%S', created_at) AS created_at "
+    "FROM request_log ORDER BY request_log.created_at DESC LIMIT ? OFFSET ?"
+)
+# Runs as one script so the whole wipe costs a single hop to the connection
+_SQL_RESET: Final = """
+BEGIN IMMEDIATE;
+UPDATE balance SET requests_earned = 0, requests_spent = 0,
+    updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+DELETE FROM exercise_log;
+DELETE FROM request_log;
+COMMIT;
+"""
+
+READ_POOL_SIZE = 4
+
+# Default page size for history queries
+HISTORY_LIMIT = 100
+
+# Request log rows are written in the background, batched by size or time.
+LOG_BATCH_SIZE = 128
+LOG_BATCH_WINDOW = 0.05
+
+logger = logging.getLogger(__name__)
+
+# Names private in-memory databases so their read pools can attach to them
+_memory_db_ids = itertools.count()
+
+
+class ReadPool:
+    """A fixed-size pool of read-only connections.
+
+    WAL mode lets readers run alongside the writer, so independent reads
+    can proceed concurrently on separate connections.
+    """
+
+    def __init__(self, uri: str, size: int = READ_POOL_SIZE) -> None:
+        self.uri = uri
+        self.size = size
+        self._pool: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def open(self) -> None:
+        """Open all pooled connections."""
+        for _ in range(self.size):
+            # Autocommit: readers never hold a transaction open between calls
+            conn = await aiosqlite.connect(self.uri, uri=True, isolation_level=None)
+            conn.row_factory = aiosqlite.Row
+            await conn.executescript(CONNECTION_PRAGMAS)
+            # mode=ro is not enforced for shared-cache in-memory databases
+            await conn.execute("PRAGMA query_only = ON")
+            self._connections.append(conn)
+            self._pool.put_nowait(conn)
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Take a connection from the pool, waiting if none is free."""
+        return await self._pool.get()
+
+    def release(self, conn: aiosqlite.Connection) -> None:
+        """Return a connection to the pool."""
+        self._pool.put_nowait(conn)
+
+
+def _to_balance(row: aiosqlite.Row | None) -> Balance:
+    """Build a Balance from a (requests_earned, requests_spent) row."""
+    if row is None:
+        return Balance(requests_available=0, requests_earned=0, requests_spent=0)
+    earned, spent = row
+    return Balance(
+        requests_available=earned - spent,
+        requests_earned=earned,
+        requests_spent=spent,
+    )
+
+
+def _read_only_uri(db_path: Path | str) -> str:
+    """Build a read-only SQLite URI for a database path or URI."""
+    if isinstance(db_path, Path):
+        return f"{db_path.resolve().as_uri()}?mode=ro"
+    if "mode=" in db_path:
+        # e.g. mode=memory; the pool's query_only PRAGMA keeps it read-only
+        return db_path
+    separator = "&" if "?" in db_path else "?"
+    return f"{db_path}{separator}mode=ro"
+
+
+def _encode_balance_message(balance: Balance) -> str:
+    """Encode a balance as a balance_update WebSocket message."""
+    return orjson.dumps({"type": "balance_update", **balance.as_dict()}).decode()
+
 
 class Database:
-    """Async database operations for vibercizing."""
+    """Async database operations for vibercizing.
+
+    Holds a single long-lived connection opened by ``init()``. Writes are
+    serialized through ``_write_lock`` so each runs in its own transaction.
+    """
 
     def __init__(self, db_path: Path | str) -> None:
-        self.db_path = Path(db_path)
+        if db_path == ":memory:":
+            # A plain :memory: database is per-connection; use a named
+            # shared-cache one so the read pool sees the same data
+            db_path = (
+                f"file:vibercizing-{next(_memory_db_ids)}?mode=memory&cache=shared"
+            )
+        # "file:" URIs (e.g. "file::memory:?cache=shared") go to SQLite as-is
+        self.is_uri = isinstance(db_path, str) and db_path.startswith("file:")
+        self.db_path = db_path if self.is_uri else Path(db_path)
+        self._conn: aiosqlite.Connection
+        self._write_lock = asyncio.Lock()
+        # Task holding the open write transaction, so its nested writes join it
+        self._transaction_task: asyncio.Task[Any] | None = None
+        # Balance written inside transaction(), published once it commits
+        self._pending_balance: Balance | None = None
+        self._read_pool = ReadPool(_read_only_uri(self.db_path))
+        # Queued request log rows, tagged with the reset() epoch they belong to
+        self._log_queue: asyncio.Queue[tuple[int, int, bool]] = asyncio.Queue()
+        self._log_epoch = 0
+        self._log_writer: asyncio.Task[None] | None = None
+        # Authoritative copy of the balance row, loaded in init() and replaced
+        # by every balance write with the values SQLite returns
+        self._balance = Balance(
+            requests_available=0, requests_earned=0, requests_spent=0
+        )
+        # Encoded balance_update message, rebuilt lazily after each write
+        self._balance_message: str | None = None
 
     async def init(self) -> None:
-        """Initialize database schema."""
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.executescript(SCHEMA)
-            await conn.execute(
-                "INSERT OR IGNORE INTO balance (id, requests_earned, requests_spent) "
-                "VALUES (1, 0, 0)"
-            )
-            await conn.commit()
+        """Open the connection, apply PRAGMAs and initialize the schema."""
+        if isinstance(self.db_path, Path):
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit: _write() issues BEGIN IMMEDIATE/COMMIT itself, and a
+        # lone statement runs as its own transaction
+        self._conn = await aiosqlite.connect(
+            self.db_path, uri=self.is_uri, isolation_level=None
+        )
+        self._conn.row_factory = aiosqlite.Row
+        await self._conn.executescript(JOURNAL_PRAGMAS)
+        await self._conn.executescript(CONNECTION_PRAGMAS)
+        await self._conn.executescript(SCHEMA)
+        await self._conn.execute(_SQL_INIT_BALANCE)
+        await self._conn.commit()
+        cursor = await self._conn.execute(_SQL_GET_BALANCE)
+        self._set_balance(_to_balance(await cursor.fetchone()))
+        await self._read_pool.open()
+        self._log_writer = asyncio.create_task(self._write_request_log())
 
-    async def get_balance(self) -> Balance:
-        """Get current balance."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            cursor = await conn.execute(
-                "SELECT requests_earned, requests_spent FROM balance WHERE id = 1"
-            )
-            row = await cursor.fetchone()
-            if row is None:
-                return Balance(requests_available=0, requests_earned=0, requests_spent=0)
-            earned, spent = row
-            return Balance(
-                requests_available=earned - spent,
-                requests_earned=earned,
-                requests_spent=spent,
-            )
+    async def close(self) -> None:
+        """Flush pending request log rows and close the database connections."""
+        if self._log_writer is not None:
+            await self._log_queue.join()
+            self._log_writer.cancel()
+            self._log_writer = None
+        await self._read_pool.close()
+        await self._conn.close()
 
-    async def credit_requests(self, amount: int) -> None:
-        """Credit requests to balance."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute(
-                "UPDATE balance SET requests_earned = requests_earned + ?, "
-                "updated_at = CURRENT_TIMESTAMP WHERE id = 1",
-                (amount,),
-            )
-            await conn.commit()
+    async def _write_request_log(self) -> None:
+        """Drain the request log queue, inserting rows in batches."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._log_queue.get()]
+            deadline = loop.time() + LOG_BATCH_WINDOW
+            while len(batch) < LOG_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._log_queue.get(), remaining)
+                    )
+                except TimeoutError:
+                    break
+            try:
+                async with self._write() as conn:
+                    # Rows from before a reset() that ran meanwhile are dropped
+                    rows = [
+                        (deducted, blocked)
+                        for epoch, deducted, blocked in batch
+                        if epoch == self._log_epoch
+                    ]
+                    if rows:
+                        await conn.executemany(_SQL_LOG_REQUEST, rows)
+            except Exception:
+                logger.exception("Failed to write %d request log rows", len(batch))
+            finally:
+                for _ in batch:
+                    self._log_queue.task_done()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Group several writes into one BEGIN IMMEDIATE ... COMMIT.
 
-    async def deduct_request(self) -> bool:
+        Writes made by the current task inside the block join this
+        transaction instead of committing one by one; if the block raises,
+        all of them are rolled back. Other tasks only see the balance once
+        the block commits. ``reset()`` raises inside it and ``close()`` must
+        not be called there; ``get_request_history()`` there omits rows other
+        tasks have not flushed yet.
         """
-        Attempt to deduct one request.
-        Returns True if successful, False if insufficient balance.
-        Always logs the attempt.
+        async with self._write():
+            yield
+
+    @asynccontextmanager
+    async def _write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run a write transaction, committing on success.
+
+        Joins the open transaction instead if the current task holds one.
         """
-        async with aiosqlite.connect(self.db_path) as conn:
-            cursor = await conn.execute(
-                "SELECT requests_earned, requests_spent FROM balance WHERE id = 1"
-            )
-            row = await cursor.fetchone()
-            if row is None:
-                return False
+        if self._owns_transaction():
+            yield self._conn
+            return
+        async with self._write_lock:
+            self._transaction_task = asyncio.current_task()
+            try:
+                await self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self._conn
+                except BaseException:
+                    await self._conn.rollback()
+                    raise
+                await self._conn.commit()
+            finally:
+                self._transaction_task = None
+                pending, self._pending_balance = self._pending_balance, None
+            # Only reached after COMMIT; a rollback discards the pending balance
+            if pending is not None:
+                self._set_balance(pending)
 
-            earned, spent = row
-            available = earned - spent
+    def _owns_transaction(self) -> bool:
+        """Whether the current task holds the open write transaction."""
+        return (
+            self._transaction_task is not None
+            and self._transaction_task is asyncio.current_task()
+        )
 
-            if available <= 0:
-                await conn.execute(
-                    "INSERT INTO request_log (requests_deducted, blocked) VALUES (1, TRUE)"
-                )
-                await conn.commit()
-                return False
+    async def _write_one(
+        self, sql: str, parameters: tuple[Any, ...] = ()
+    ) -> list[aiosqlite.Row]:
+        """Run a single write statement as its own transaction.
 
-            await conn.execute(
-                "UPDATE balance SET requests_spent = requests_spent + 1, "
-                "updated_at = CURRENT_TIMESTAMP WHERE id = 1"
-            )
-            await conn.execute(
-                "INSERT INTO request_log (requests_deducted, blocked) VALUES (1, FALSE)"
-            )
-            await conn.commit()
-            return True
+        Executes and fetches in one hop to the connection thread, which
+        halves the round-trips of a ``_write()`` block for one statement.
+        Inside ``transaction()`` the statement joins that transaction.
+        """
+        if self._owns_transaction():
+            return list(await self._conn.execute_fetchall(sql, parameters))
+        async with self._write_lock:
+            return list(await self._conn.execute_fetchall(sql, parameters))
+
+    def _set_balance(self, balance: Balance) -> None:
+        """Replace the cached balance after a committed balance write.
+
+        Callers run this right after their write transaction, with no await in
+        between, so cached balances are applied in commit order. Inside
+        ``transaction()`` the balance is held back until the commit.
+        """
+        if self._owns_transaction():
+            self._pending_balance = balance
+            return
+        self._balance = balance
+        self._balance_message = None
+
+    def get_balance_message(self) -> str:
+        """Get the encoded balance_update message, reusing it until the next write."""
+        if self._balance_message is None:
+            self._balance_message = _encode_balance_message(self._balance)
+        return self._balance_message
+
+    async def get_balance(self) -> Balance:
+        """Get current balance from memory; writes keep it in sync."""
+        if self._pending_balance is not None and self._owns_transaction():
+            return self._pending_balance
+        return self._balance
+
+    async def credit_requests(self, amount: int) -> Balance:
+        """Credit requests to balance and return the updated balance."""
+        (row,) = await self._write_one(_SQL_CREDIT, (amount,))
+        balance = _to_balance(row)
+        self._set_balance(balance)
+        return balance
+
+    async def deduct_request(self) -> tuple[bool, Balance]:
+        """
+        Attempt to deduct one request.
+        Returns (success, balance after the attempt); success is False if
+        the balance was insufficient. Always logs the attempt, though the
+        log row is written in the background.
+        """
+        rows = await self._write_one(_SQL_DEDUCT)
+        success = bool(rows)
+        if success:
+            self._set_balance(_to_balance(rows[0]))
+        if self._owns_transaction():
+            # Log in the same transaction so a rollback drops the row too
+            await self._conn.execute(_SQL_LOG_REQUEST, (1, not success))
+        else:
+            self._log_queue.put_nowait((self._log_epoch, 1, not success))
+        return success, await self.get_balance()
 
     async def log_exercise(
         self, exercise_type: str, reps: int, requests_awarded: int
     ) -> None:
         """Log an exercise session."""
-        async with aiosqlite.connect(self.db_path) as conn:
+        await self._write_one(
+            _SQL_LOG_EXERCISE, (exercise_type, reps, requests_awarded)
+        )
+
+    async def record_exercise(
+        self, exercise_type: str, reps: int, requests_awarded: int
+    ) -> Balance:
+        """
+        Credit the awarded requests and log the exercise in one transaction.
+        Returns the updated balance.
+        """
+        async with self._write() as conn:
+            cursor = await conn.execute(_SQL_CREDIT, (requests_awarded,))
+            balance = _to_balance(await cursor.fetchone())
             await conn.execute(
-                "INSERT INTO exercise_log (exercise_type, reps_completed, requests_awarded) "
-                "VALUES (?, ?, ?)",
-                (exercise_type, reps, requests_awarded),
+                _SQL_LOG_EXERCISE, (exercise_type, reps, requests_awarded)
             )
-            await conn.commit()
+        self._set_balance(balance)
+        return balance
 
-    async def get_exercise_history(self) -> list[ExerciseLogEntry]:
-        """Get exercise history."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute(
-                "SELECT id, exercise_type, reps_completed, requests_awarded, created_at "
-                "FROM exercise_log ORDER BY created_at DESC"
-            )
-            rows = await cursor.fetchall()
-            return [
-                ExerciseLogEntry(
-                    id=row["id"],
-                    exercise_type=row["exercise_type"],
-                    reps_completed=row["reps_completed"],
-                    requests_awarded=row["requests_awarded"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                )
-                for row in rows
-            ]
-
-    async def get_request_history(self) -> list[RequestLogEntry]:
-        """Get request history."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute(
-                "SELECT id, requests_deducted, blocked, created_at "
-                "FROM request_log ORDER BY created_at DESC"
-            )
-            rows = await cursor.fetchall()
-            return [
-                RequestLogEntry(
-                    id=row["id"],
-                    requests_deducted=row["requests_deducted"],
-                    blocked=bool(row["blocked"]),
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                )
-                for row in rows
-            ]
+    async def _read(
+        self, sql: str, parameters: tuple[Any, ...]
+    ) -> list[aiosqlite.Row]:
+        """Run a query on a pooled read connection.
+
+        Inside ``transaction()`` it runs on the writer connection instead, so
+        the task sees its own uncommitted writes.
+        """
+        if self._owns_transaction():
+            return list(await self._conn.execute_fetchall(sql, parameters))
+        conn = await self._read_pool.acquire()
+        try:
+            async with conn.execute(sql, parameters) as cursor:
+                return list(await cursor.fetchall())
+        finally:
+            self._read_pool.release(conn)
+
+    async def get_exercise_history(
+        self, limit: int = HISTORY_LIMIT, offset: int = 0
+    ) -> list[dict[str, Any]]:
+        """Get a page of exercise history as plain dicts, newest first."""
+        rows = await self._read(_SQL_EXERCISE_HISTORY, (limit, offset))
+        return [dict(row) for row in rows]
+
+    async def get_request_history(
+        self, limit: int = HISTORY_LIMIT, offset: int = 0
+    ) -> list[dict[str, Any]]:
+        """Get a page of request history as plain dicts, newest first."""
+        if not self._owns_transaction():
+            # Inside transaction() the log writer is blocked on our lock
+            await self._log_queue.join()
+        rows = await self._read(_SQL_REQUEST_HISTORY, (limit, offset))
+        return [{**row, "blocked": bool(row["blocked"])} for row in rows]
 
     async def reset(self) -> None:
         """Reset all data (balance and history)."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute(
-                "UPDATE balance SET requests_earned = 0, requests_spent = 0, "
-                "updated_at = CURRENT_TIMESTAMP WHERE id = 1"
-            )
-            await conn.execute("DELETE FROM exercise_log")
-            await conn.execute("DELETE FROM request_log")
-            await conn.commit()
+        if self._owns_transaction():
+            raise RuntimeError("reset() cannot run inside transaction()")
+        async with self._write_lock:
+            # Discard request log rows not yet written, including any batch
+            # the log writer holds while waiting for this lock
+            self._log_epoch += 1
+            while not self._log_queue.empty():
+                self._log_queue.get_nowait()
+                self._log_queue.task_done()
+            try:
+                await self._conn.executescript(_SQL_RESET)
+            except BaseException:
+                if self._conn.in_transaction:
+                    await self._conn.rollback()
+                raise
+        self._set_balance(
+            Balance(requests_available=0, requests_earned=0, requests_spent=0)
+        )
@@ -1,6 +1,7 @@
 """Exercise configuration and validation."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
 
 @dataclass(frozen=True)
@@ -11,21 +12,25 @@ class ExerciseConfig:
     display_name: str
     reps_required: int
     requests_awarded: int
+    # Validation messages, precomputed once per config
+    completed_message: str = field(init=False, repr=False)
+    too_few_reps_message: str = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "completed_message", f"Completed {self.display_name}!")
+        object.__setattr__(
+            self, "too_few_reps_message", f"Need {self.reps_required} reps"
+        )
 
 
-EXERCISES: dict[str, ExerciseConfig] = {
+EXERCISES: MappingProxyType[str, ExerciseConfig] = MappingProxyType({
     "jumping_jacks": ExerciseConfig(
         name="jumping_jacks",
         display_name="Jumping Jacks",
         reps_required=20,
         requests_awarded=1,
     ),
-}
-
-
-def get_exercise_config(exercise_name: str) -> ExerciseConfig | None:
-    """Get configuration for an exercise by name."""
-    return EXERCISES.get(exercise_name)
+})
 
 
 def validate_exercise_completion(
@@ -37,15 +42,11 @@ def validate_exercise_completion(
     Returns:
         tuple of (success, message, requests_awarded)
     """
-    config = get_exercise_config(exercise_name)
+    config = EXERCISES.get(exercise_name)
     if config is None:
         return False, f"Unknown exercise: {exercise_name}", 0
 
     if reps < config.reps_required:
-        return (
-            False,
-            f"Need {config.reps_required} reps, got {reps}",
-            0,
-        )
+        return False, f"{config.too_few_reps_message}, got {reps}", 0
 
-    return True, f"Completed {config.display_name}!", config.requests_awarded
+    return True, config.completed_message, config.requests_awarded
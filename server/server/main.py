@@ -1,50 +1,84 @@
 """FastAPI application for Vibercizing."""
 
+import asyncio
+import logging
+import os
+import socket
+import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect
+import orjson
+from fastapi import Depends, FastAPI, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from server.database import Database
+from server.database import HISTORY_LIMIT, Database
 from server.exercises import validate_exercise_completion
-from server.models import Balance, DeductResponse
+from server.models import Balance, DeductResponse, HistoryResponse
 
 
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 DB_PATH = DATA_DIR / "vibercizing.db"
 
+
+def default_socket_path() -> Path:
+    """Per-user path of the Unix socket the plugin hook connects to.
+
+    Fixed rather than under the repo, so the hook finds it wherever the
+    plugin is installed. The hook computes the same path.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    base = Path(runtime_dir) if runtime_dir else Path.home() / ".vibercizing"
+    return base / "vibercizing.sock"
+
+
+SOCKET_PATH = Path(os.environ.get("VIBERCIZING_SOCKET") or default_socket_path())
+
 _db: Database | None = None
+# Unix socket bound by main(), removed again on shutdown
+_bound_socket_path: Path | None = None
+
+logger = logging.getLogger(__name__)
+
+
+async def _send_json(websocket: WebSocket, message: dict) -> None:
+    """Send a message as a JSON text frame, encoded with orjson."""
+    await websocket.send_text(orjson.dumps(message).decode())
 
 
 class ConnectionManager:
     """Manages active WebSocket connections for broadcasting."""
 
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        self.active_connections: set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast_balance(self, balance: Balance):
-        """Broadcast balance update to all connected clients."""
-        message = {
-            "type": "balance_update",
-            "requests_available": balance.requests_available,
-            "requests_earned": balance.requests_earned,
-            "requests_spent": balance.requests_spent,
-        }
-        for connection in self.active_connections:
+        self.active_connections.discard(websocket)
+
+    async def broadcast_balance(self, message: str):
+        """Broadcast an encoded balance update to all connected clients concurrently."""
+        connections = list(self.active_connections)
+        if len(connections) == 1:
+            # Usual case of one open tab: send directly, no task per send
             try:
-                await connection.send_json(message)
+                await connections[0].send_text(message)
             except Exception:
-                # Connection may have closed, will be cleaned up on disconnect
-                pass
+                self.disconnect(connections[0])
+            return
+        results = await asyncio.gather(
+            *(connection.send_text(message) for connection in connections),
+            return_exceptions=True,
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                # Connection has closed; stop sending to it
+                self.disconnect(connection)
 
 
 manager = ConnectionManager()
@@ -59,12 +93,15 @@ def get_db() -> Database:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database on startup and close it on shutdown."""
     global _db
     _db = Database(DB_PATH)
     await _db.init()
     yield
+    await _db.close()
     _db = None
+    if _bound_socket_path is not None:
+        _bound_socket_path.unlink(missing_ok=True)
 
 
 app = FastAPI(
@@ -72,6 +109,7 @@ app = FastAPI(
     description="Earn Claude Code requests through exercise",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -83,42 +121,50 @@ app.add_middleware(
 )
 
 
-@app.get("/api/balance", response_model=Balance)
-async def get_balance(db: Annotated[Database, Depends(get_db)]) -> Balance:
+# The handlers below build their JSON directly and declare the models only
+# for the OpenAPI schema, skipping response_model validation per request.
+@app.get("/api/balance", responses={200: {"model": Balance}})
+async def get_balance(db: Annotated[Database, Depends(get_db)]) -> ORJSONResponse:
     """Get current request balance."""
-    return await db.get_balance()
+    balance = await db.get_balance()
+    return ORJSONResponse(balance.as_dict())
 
 
-@app.post("/api/deduct", response_model=DeductResponse)
-async def deduct_request(db: Annotated[Database, Depends(get_db)]) -> DeductResponse:
+@app.post("/api/deduct", responses={200: {"model": DeductResponse}})
+async def deduct_request(db: Annotated[Database, Depends(get_db)]) -> ORJSONResponse:
     """Attempt to deduct one request."""
-    success = await db.deduct_request()
-    balance = await db.get_balance()
+    success, balance = await db.deduct_request()
 
     # Broadcast balance update to all connected WebSocket clients
-    await manager.broadcast_balance(balance)
+    await manager.broadcast_balance(db.get_balance_message())
 
     if success:
-        return DeductResponse(
-            success=True,
-            requests_remaining=balance.requests_available,
-        )
-    return DeductResponse(
-        success=False,
-        requests_available=balance.requests_available,
-        error="Insufficient requests. Exercise to earn more!",
+        return ORJSONResponse({
+            "success": True,
+            "requests_remaining": balance.requests_available,
+            "requests_available": None,
+            "error": None,
+        })
+    return ORJSONResponse({
+        "success": False,
+        "requests_remaining": None,
+        "requests_available": balance.requests_available,
+        "error": "Insufficient requests. Exercise to earn more!",
+    })
+
+
+@app.get("/api/history", responses={200: {"model": HistoryResponse}})
+async def get_history(
+    db: Annotated[Database, Depends(get_db)],
+    limit: Annotated[int, Query(ge=1, le=1000)] = HISTORY_LIMIT,
+    offset: Annotated[int, Query(ge=0)] = 0,
+) -> ORJSONResponse:
+    """Get a page of exercise and request history, newest first."""
+    exercises, requests = await asyncio.gather(
+        db.get_exercise_history(limit, offset),
+        db.get_request_history(limit, offset),
     )
-
-
-@app.get("/api/history")
-async def get_history(db: Annotated[Database, Depends(get_db)]) -> dict:
-    """Get exercise and request history."""
-    exercises = await db.get_exercise_history()
-    requests = await db.get_request_history()
-    return {
-        "exercises": [e.model_dump() for e in exercises],
-        "requests": [r.model_dump() for r in requests],
-    }
+    return ORJSONResponse({"exercises": exercises, "requests": requests})
 
 
 @app.post("/api/reset")
@@ -136,16 +182,10 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
 
     try:
         # Send initial balance
-        balance = await db.get_balance()
-        await websocket.send_json({
-            "type": "balance_update",
-            "requests_available": balance.requests_available,
-            "requests_earned": balance.requests_earned,
-            "requests_spent": balance.requests_spent,
-        })
+        await websocket.send_text(db.get_balance_message())
 
         while True:
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
 
             if data.get("type") == "exercise_complete":
                 exercise = data.get("exercise", "")
@@ -156,38 +196,75 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                 )
 
                 if success:
-                    await db.credit_requests(requests_awarded)
-                    await db.log_exercise(exercise, reps, requests_awarded)
+                    balance = await db.record_exercise(
+                        exercise, reps, requests_awarded
+                    )
 
-                    await websocket.send_json({
-                        "type": "request_awarded",
+                    # Award and new balance travel in a single frame
+                    await _send_json(websocket, {
+                        "type": "exercise_result",
                         "exercise": exercise,
                         "requests": requests_awarded,
                         "message": f"Nice! +{requests_awarded} request for {reps} {exercise.replace('_', ' ')}",
-                    })
-
-                    balance = await db.get_balance()
-                    await websocket.send_json({
-                        "type": "balance_update",
-                        "requests_available": balance.requests_available,
-                        "requests_earned": balance.requests_earned,
-                        "requests_spent": balance.requests_spent,
+                        **balance.as_dict(),
                     })
                 else:
-                    await websocket.send_json({
+                    await _send_json(websocket, {
                         "type": "error",
                         "message": message,
                     })
 
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also covers handler errors, so failed sockets never linger in the set
         manager.disconnect(websocket)
 
 
+def _bind_unix_socket(path: Path) -> socket.socket:
+    """Bind a Unix domain socket at path, replacing any stale socket file."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(str(path))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
 def main():
-    """Entry point for the server."""
+    """Entry point for the server.
+
+    Listens on TCP port 8000 for the browser client and, where supported,
+    on a Unix domain socket that the plugin hook uses to skip TCP setup.
+    """
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    global _bound_socket_path
+    config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        # uvloop has no Windows build; httptools is a faster HTTP parser than h11
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        access_log=False,
+        log_level="warning",
+    )
+    sockets = [config.bind_socket()]
+    if sys.platform != "win32":
+        try:
+            sockets.append(_bind_unix_socket(SOCKET_PATH))
+        except OSError as e:
+            # Optional fast path (e.g. path too long, dir not writable);
+            # the hook falls back to TCP
+            logger.warning("Not listening on %s: %s", SOCKET_PATH, e)
+        else:
+            _bound_socket_path = SOCKET_PATH
+    uvicorn.Server(config).run(sockets=sockets)
 
 
 if __name__ == "__main__":
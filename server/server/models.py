@@ -1,16 +1,31 @@
-"""Pydantic models for API and database."""
+"""Data models for the API, WebSocket messages and database."""
 
+from dataclasses import dataclass
 from datetime import datetime
-from pydantic import BaseModel
+from typing import Annotated, Literal
 
+from pydantic import BaseModel, Field
 
-class Balance(BaseModel):
+
+# A slotted dataclass rather than a Pydantic model: one is built from a trusted
+# database row on every write, so validation buys nothing. Frozen because
+# Database hands out its cached instance.
+@dataclass(slots=True, frozen=True)
+class Balance:
     """Current balance state."""
 
     requests_available: int
     requests_earned: int
     requests_spent: int
 
+    def as_dict(self) -> dict[str, int]:
+        """Return the fields as a plain dict for JSON messages."""
+        return {
+            "requests_available": self.requests_available,
+            "requests_earned": self.requests_earned,
+            "requests_spent": self.requests_spent,
+        }
+
 
 class ExerciseLogEntry(BaseModel):
     """A logged exercise session."""
@@ -31,6 +46,13 @@ class RequestLogEntry(BaseModel):
     created_at: datetime
 
 
+class HistoryResponse(BaseModel):
+    """Response from history endpoint."""
+
+    exercises: list[ExerciseLogEntry]
+    requests: list[RequestLogEntry]
+
+
 class DeductResponse(BaseModel):
     """Response from deduct endpoint."""
 
@@ -43,19 +65,35 @@ class DeductResponse(BaseModel):
 class BalanceUpdate(BaseModel):
     """WebSocket message for balance updates."""
 
-    type: str = "balance_update"
+    type: Literal["balance_update"] = "balance_update"
     requests_available: int
     requests_earned: int
     requests_spent: int
 
 
-class RequestAwarded(BaseModel):
-    """WebSocket message for request awarded."""
+class ExerciseResult(BaseModel):
+    """WebSocket message for a credited exercise and the new balance."""
 
-    type: str = "request_awarded"
+    type: Literal["exercise_result"] = "exercise_result"
     exercise: str
     requests: int
     message: str
+    requests_available: int
+    requests_earned: int
+    requests_spent: int
+
+
+class ErrorMessage(BaseModel):
+    """WebSocket message for a rejected client message."""
+
+    type: Literal["error"] = "error"
+    message: str
+
+
+# Any message the server sends over the WebSocket, told apart by "type"
+ServerMessage = Annotated[
+    BalanceUpdate | ExerciseResult | ErrorMessage, Field(discriminator="type")
+]
 
 
 class ExerciseComplete(BaseModel):
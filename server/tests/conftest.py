@@ -0,0 +1,142 @@
+"""Shared fixtures for server tests."""
+
+import asyncio
+import sqlite3
+import sys
+from collections.abc import AsyncIterator, Generator, Iterable
+from typing import Any
+
+import pytest
+import pytest_asyncio
+
+import server.database as database_module
+from server.database import Database
+
+
+class InlineCursor:
+    """Async cursor facade over a sqlite3 cursor, without a worker thread."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+    async def fetchone(self) -> Any:
+        return self._cursor.fetchone()
+
+    async def fetchall(self) -> list[Any]:
+        return self._cursor.fetchall()
+
+    async def close(self) -> None:
+        self._cursor.close()
+
+
+class InlineResult:
+    """An executed statement usable with ``await`` or ``async with``."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = InlineCursor(cursor)
+
+    def __await__(self) -> Generator[Any, None, InlineCursor]:
+        return self.__aenter__().__await__()
+
+    async def __aenter__(self) -> InlineCursor:
+        return self._cursor
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self._cursor.close()
+
+
+class InlineConnection:
+    """The subset of aiosqlite.Connection used by Database, run in-process."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    @property
+    def row_factory(self) -> Any:
+        return self._conn.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory: Any) -> None:
+        self._conn.row_factory = factory
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.in_transaction
+
+    def execute(self, sql: str, parameters: Iterable[Any] = ()) -> InlineResult:
+        return InlineResult(self._conn.execute(sql, parameters))
+
+    async def execute_fetchall(
+        self, sql: str, parameters: Iterable[Any] = ()
+    ) -> list[Any]:
+        return self._conn.execute(sql, parameters).fetchall()
+
+    async def executemany(
+        self, sql: str, parameters: Iterable[Iterable[Any]]
+    ) -> InlineCursor:
+        return InlineCursor(self._conn.executemany(sql, parameters))
+
+    async def executescript(self, script: str) -> InlineCursor:
+        return InlineCursor(self._conn.executescript(script))
+
+    async def commit(self) -> None:
+        self._conn.commit()
+
+    async def rollback(self) -> None:
+        self._conn.rollback()
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+async def connect_inline(database: str, **kwargs: Any) -> InlineConnection:
+    """Open a sqlite3 connection wrapped in the aiosqlite-style API."""
+    return InlineConnection(sqlite3.connect(database, **kwargs))
+
+
+class FastTestDatabase(Database):
+    """Database that runs SQL inline instead of on aiosqlite's worker thread.
+
+    The shared in-memory test database is uncontended, so the thread hop per
+    query costs more than the query itself. Tests that exercise concurrency
+    or transactions use ``aio_db`` instead, which runs on aiosqlite.
+    """
+
+    async def init(self) -> None:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(database_module.aiosqlite, "connect", connect_inline)
+            await super().init()
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    """Run the session's event loop on uvloop, as the server does."""
+    if sys.platform == "win32":
+        return asyncio.DefaultEventLoopPolicy()
+    import uvloop
+
+    return uvloop.EventLoopPolicy()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def db() -> AsyncIterator[Database]:
+    """Create one in-memory database shared by the whole test session."""
+    database = FastTestDatabase(":memory:")
+    await database.init()
+    yield database
+    await database.close()
+
+
+@pytest.fixture
+async def aio_db() -> AsyncIterator[Database]:
+    """Create a private in-memory database running on aiosqlite's thread."""
+    database = Database(":memory:")
+    await database.init()
+    yield database
+    await database.close()
+
+
+@pytest.fixture(autouse=True)
+async def _clean_db(db: Database) -> None:
+    """Reset the shared database to its zeroed state before each test."""
+    await db.reset()
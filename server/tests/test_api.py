@@ -1,5 +1,7 @@
 """Tests for REST API endpoints."""
 
+from datetime import datetime
+
 import pytest
 from httpx import ASGITransport, AsyncClient
 
@@ -7,15 +9,6 @@ from server.main import app, get_db
 from server.database import Database
 
 
-@pytest.fixture
-async def db(tmp_path) -> Database:
-    """Create a fresh database for each test."""
-    db_path = tmp_path / "test.db"
-    database = Database(db_path)
-    await database.init()
-    return database
-
-
 @pytest.fixture
 async def client(db: Database) -> AsyncClient:
     """Create test client with overridden database."""
@@ -97,6 +90,8 @@ class TestHistoryEndpoint:
         data = response.json()
         assert len(data["exercises"]) == 1
         assert data["exercises"][0]["exercise_type"] == "jumping_jacks"
+        created_at = data["exercises"][0]["created_at"]
+        assert created_at == datetime.fromisoformat(created_at).isoformat()
 
     async def test_returns_request_history(
         self, client: AsyncClient, db: Database
@@ -108,6 +103,18 @@ class TestHistoryEndpoint:
         assert len(data["requests"]) == 1
         assert data["requests"][0]["blocked"] is False
 
+    async def test_limits_history_page(
+        self, client: AsyncClient, db: Database
+    ) -> None:
+        for _ in range(3):
+            await db.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
+        response = await client.get("/api/history", params={"limit": 2})
+        assert len(response.json()["exercises"]) == 2
+
+    async def test_rejects_invalid_limit(self, client: AsyncClient) -> None:
+        response = await client.get("/api/history", params={"limit": 0})
+        assert response.status_code == 422
+
 
 class TestResetEndpoint:
     """Tests for POST /api/reset."""
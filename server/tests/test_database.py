@@ -1,53 +1,213 @@
 """Tests for database layer."""
 
-import pytest
+import asyncio
+import sqlite3
+import sys
+from dataclasses import FrozenInstanceError
 from pathlib import Path
+
+import aiosqlite
+import orjson
+import pytest
+
 from server.database import Database
 
 
-@pytest.fixture
-async def db(tmp_path: Path) -> Database:
-    """Create a fresh database for each test."""
-    db_path = tmp_path / "test.db"
-    database = Database(db_path)
-    await database.init()
-    return database
+class TestInit:
+    """Tests for database initialization."""
+
+    async def test_file_database_uses_wal_mode(self, tmp_path: Path) -> None:
+        db = Database(tmp_path / "test.db")
+        await db.init()
+        await db.credit_requests(1)
+        await db.close()
+        async with aiosqlite.connect(db.db_path) as conn:
+            cursor = await conn.execute("PRAGMA journal_mode")
+            row = await cursor.fetchone()
+        assert row[0] == "wal"
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="mmap is off on Windows")
+    async def test_file_database_uses_mmap(self, tmp_path: Path) -> None:
+        db = Database(tmp_path / "test.db")
+        await db.init()
+        try:
+            cursor = await db._conn.execute("PRAGMA mmap_size")
+            row = await cursor.fetchone()
+        finally:
+            await db.close()
+        assert row[0] > 0
+
+    async def test_writer_connection_skips_full_sync(self, db: Database) -> None:
+        cursor = await db._conn.execute("PRAGMA synchronous")
+        assert (await cursor.fetchone())[0] == 1  # NORMAL
+        cursor = await db._conn.execute("PRAGMA temp_store")
+        assert (await cursor.fetchone())[0] == 2  # MEMORY
+
+    async def test_memory_databases_are_independent(self) -> None:
+        first, second = Database(":memory:"), Database(":memory:")
+        await first.init()
+        await second.init()
+        try:
+            await first.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
+            assert len(await first.get_exercise_history()) == 1
+            assert await second.get_exercise_history() == []
+        finally:
+            await first.close()
+            await second.close()
+
+    async def test_read_pool_connections_are_read_only(self, db: Database) -> None:
+        conn = await db._read_pool.acquire()
+        try:
+            with pytest.raises(sqlite3.OperationalError):
+                await conn.execute("DELETE FROM exercise_log")
+        finally:
+            db._read_pool.release(conn)
+
+    async def test_balance_persists_across_reopen(self, tmp_path: Path) -> None:
+        first = Database(tmp_path / "reopen.db")
+        await first.init()
+        await first.credit_requests(4)
+        await first.close()
+
+        second = Database(tmp_path / "reopen.db")
+        await second.init()
+        balance = await second.get_balance()
+        await second.close()
+        assert balance.requests_earned == 4
 
 
 class TestBalance:
     """Tests for balance operations."""
 
-    async def test_initial_balance_is_zero(self, db: Database) -> None:
+    @pytest.mark.parametrize(
+        ("ops", "expected"),
+        [
+            pytest.param([], (0, 0, 0), id="initial_balance_is_zero"),
+            pytest.param([("credit", 5)], (5, 5, 0), id="credit_increases_earned"),
+            pytest.param(
+                [("credit", 3), ("deduct", True)],
+                (2, 3, 1),
+                id="deduct_increases_spent",
+            ),
+            pytest.param(
+                [("deduct", False)], (0, 0, 0), id="deduct_fails_when_no_balance"
+            ),
+            pytest.param(
+                [("credit", 2), ("credit", 3)],
+                (5, 5, 0),
+                id="multiple_credits_accumulate",
+            ),
+        ],
+    )
+    async def test_operations_update_balance(
+        self,
+        db: Database,
+        ops: list[tuple[str, int | bool]],
+        expected: tuple[int, int, int],
+    ) -> None:
+        """Apply credit/deduct ops, then check (available, earned, spent)."""
+        for op, arg in ops:
+            if op == "credit":
+                await db.credit_requests(arg)
+            else:
+                result, _ = await db.deduct_request()
+                assert result is arg
         balance = await db.get_balance()
-        assert balance.requests_available == 0
-        assert balance.requests_earned == 0
-        assert balance.requests_spent == 0
-
-    async def test_credit_increases_earned(self, db: Database) -> None:
-        await db.credit_requests(5)
-        balance = await db.get_balance()
-        assert balance.requests_earned == 5
-        assert balance.requests_available == 5
+        assert (
+            balance.requests_available,
+            balance.requests_earned,
+            balance.requests_spent,
+        ) == expected
 
-    async def test_deduct_increases_spent(self, db: Database) -> None:
+    async def test_deduct_returns_updated_balance(self, db: Database) -> None:
         await db.credit_requests(3)
-        result = await db.deduct_request()
-        assert result is True
-        balance = await db.get_balance()
-        assert balance.requests_spent == 1
+        _, balance = await db.deduct_request()
         assert balance.requests_available == 2
+        assert balance.requests_spent == 1
 
-    async def test_deduct_fails_when_no_balance(self, db: Database) -> None:
-        result = await db.deduct_request()
+    async def test_failed_deduct_returns_current_balance(self, db: Database) -> None:
+        await db.credit_requests(1)
+        await db.deduct_request()
+        result, balance = await db.deduct_request()
         assert result is False
-        balance = await db.get_balance()
-        assert balance.requests_spent == 0
+        assert balance.requests_available == 0
+        assert balance.requests_earned == 1
 
-    async def test_multiple_credits_accumulate(self, db: Database) -> None:
+    async def test_credit_returns_updated_balance(self, db: Database) -> None:
         await db.credit_requests(2)
-        await db.credit_requests(3)
+        balance = await db.credit_requests(3)
+        assert balance.requests_earned == 5
+        assert balance.requests_available == 5
+
+    async def test_cached_balance_is_immutable(self, db: Database) -> None:
         balance = await db.get_balance()
+        with pytest.raises(FrozenInstanceError):
+            balance.requests_earned = 10
+        assert (await db.get_balance()).requests_earned == 0
+
+    async def test_transaction_groups_writes(self, aio_db: Database) -> None:
+        async with aio_db.transaction():
+            await aio_db.credit_requests(2)
+            await aio_db.credit_requests(3)
+            await aio_db.deduct_request()
+        balance = await aio_db.get_balance()
         assert balance.requests_earned == 5
+        assert balance.requests_available == 4
+
+    async def test_transaction_rolls_back_on_error(self, aio_db: Database) -> None:
+        await aio_db.credit_requests(1)
+        with pytest.raises(RuntimeError):
+            async with aio_db.transaction():
+                await aio_db.credit_requests(5)
+                await aio_db.log_exercise("jumping_jacks", reps=20, requests_awarded=5)
+                raise RuntimeError("boom")
+        assert (await aio_db.get_balance()).requests_earned == 1
+        assert await aio_db.get_exercise_history() == []
+
+    async def test_transaction_hides_balance_until_commit(
+        self, aio_db: Database
+    ) -> None:
+        seen = []
+
+        async def observe() -> None:
+            seen.append((await aio_db.get_balance()).requests_earned)
+            seen.append(orjson.loads(aio_db.get_balance_message())["requests_earned"])
+
+        async with aio_db.transaction():
+            await aio_db.credit_requests(2)
+            assert (await aio_db.get_balance()).requests_earned == 2
+            await asyncio.create_task(observe())
+        assert seen == [0, 0]
+        assert (await aio_db.get_balance()).requests_earned == 2
+
+    async def test_rolled_back_deduct_is_not_logged(self, aio_db: Database) -> None:
+        with pytest.raises(RuntimeError):
+            async with aio_db.transaction():
+                result, _ = await aio_db.deduct_request()
+                assert result is False
+                raise RuntimeError("boom")
+        assert await aio_db.get_request_history() == []
+
+    async def test_request_history_inside_transaction(self, aio_db: Database) -> None:
+        await aio_db.credit_requests(1)
+        async with aio_db.transaction():
+            await aio_db.deduct_request()
+            history = await asyncio.wait_for(aio_db.get_request_history(), 1)
+        assert len(history) == 1
+        assert len(await aio_db.get_request_history()) == 1
+
+    async def test_balance_message_reflects_writes(self, db: Database) -> None:
+        assert orjson.loads(db.get_balance_message()) == {
+            "type": "balance_update",
+            "requests_available": 0,
+            "requests_earned": 0,
+            "requests_spent": 0,
+        }
+        await db.credit_requests(2)
+        await db.deduct_request()
+        message = orjson.loads(db.get_balance_message())
+        assert message["requests_available"] == 1
+        assert message["requests_spent"] == 1
 
     async def test_reset_clears_all_balances(self, db: Database) -> None:
         await db.credit_requests(10)
@@ -66,9 +226,9 @@ class TestExerciseLog:
         await db.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
         history = await db.get_exercise_history()
         assert len(history) == 1
-        assert history[0].exercise_type == "jumping_jacks"
-        assert history[0].reps_completed == 20
-        assert history[0].requests_awarded == 1
+        assert history[0]["exercise_type"] == "jumping_jacks"
+        assert history[0]["reps_completed"] == 20
+        assert history[0]["requests_awarded"] == 1
 
     async def test_multiple_exercises_logged_in_order(self, db: Database) -> None:
         await db.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
@@ -76,6 +236,20 @@ class TestExerciseLog:
         history = await db.get_exercise_history()
         assert len(history) == 2
 
+    async def test_record_exercise_credits_and_logs(self, db: Database) -> None:
+        balance = await db.record_exercise("jumping_jacks", reps=20, requests_awarded=1)
+        assert balance.requests_available == 1
+        assert (await db.get_balance()).requests_earned == 1
+        history = await db.get_exercise_history()
+        assert len(history) == 1
+        assert history[0]["reps_completed"] == 20
+
+    async def test_history_is_paginated(self, db: Database) -> None:
+        for _ in range(5):
+            await db.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
+        assert len(await db.get_exercise_history(limit=3)) == 3
+        assert len(await db.get_exercise_history(limit=3, offset=3)) == 2
+
     async def test_reset_clears_exercise_history(self, db: Database) -> None:
         await db.log_exercise("jumping_jacks", reps=20, requests_awarded=1)
         await db.reset()
@@ -91,14 +265,31 @@ class TestRequestLog:
         await db.deduct_request()
         history = await db.get_request_history()
         assert len(history) == 1
-        assert history[0].requests_deducted == 1
-        assert history[0].blocked is False
+        assert history[0]["requests_deducted"] == 1
+        assert history[0]["blocked"] is False
 
     async def test_failed_deduct_logs_blocked(self, db: Database) -> None:
         await db.deduct_request()  # Should fail and log as blocked
         history = await db.get_request_history()
         assert len(history) == 1
-        assert history[0].blocked is True
+        assert history[0]["blocked"] is True
+
+    async def test_reset_drops_deducts_racing_it(self, aio_db: Database) -> None:
+        await aio_db.credit_requests(1)
+        await asyncio.gather(aio_db.deduct_request(), aio_db.reset())
+        assert await aio_db.get_request_history() == []
+
+    async def test_reset_inside_transaction_raises(self, aio_db: Database) -> None:
+        with pytest.raises(RuntimeError):
+            async with aio_db.transaction():
+                await aio_db.reset()
+
+    async def test_concurrent_deducts_are_all_logged(self, aio_db: Database) -> None:
+        await aio_db.credit_requests(3)
+        await asyncio.gather(*(aio_db.deduct_request() for _ in range(5)))
+        history = await aio_db.get_request_history()
+        assert len(history) == 5
+        assert sum(entry["blocked"] for entry in history) == 2
 
     async def test_reset_clears_request_history(self, db: Database) -> None:
         await db.credit_requests(1)
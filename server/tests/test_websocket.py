@@ -1,30 +1,60 @@
 """Tests for WebSocket functionality."""
 
+from collections.abc import Iterator
+
+import orjson
 import pytest
-from starlette.testclient import TestClient
+from pydantic import TypeAdapter
+from starlette.testclient import TestClient, WebSocketTestSession
 
 import server.main as main_module
-from server.main import app
-from server.database import Database
+from server.main import ConnectionManager, app
+from server.models import BalanceUpdate, ErrorMessage, ExerciseResult, ServerMessage
 
+# Built once so every test reuses the compiled validator
+decoder: TypeAdapter[ServerMessage] = TypeAdapter(ServerMessage)
 
-@pytest.fixture
-async def db(tmp_path) -> Database:
-    """Create a fresh database for each test."""
-    db_path = tmp_path / "test.db"
-    database = Database(db_path)
-    await database.init()
-    return database
+
+def _exercise_complete(exercise: str, reps: int) -> str:
+    """Encode an exercise_complete message as the browser client sends it."""
+    return orjson.dumps({
+        "type": "exercise_complete",
+        "exercise": exercise,
+        "reps": reps,
+    }).decode()
+
+
+# Client messages, encoded once for every test that sends them
+_PAYLOAD_OK = _exercise_complete("jumping_jacks", 20)
+_PAYLOAD_SHORT = _exercise_complete("jumping_jacks", 10)
+_PAYLOAD_UNKNOWN = _exercise_complete("unknown_exercise", 20)
+
+
+@pytest.fixture(scope="session")
+def session_client() -> Iterator[TestClient]:
+    """Run the app once, with its own in-memory database, for every test.
+
+    The database is created by the app's lifespan on the TestClient's event
+    loop: its request-log queue and writer task belong to the loop that made
+    them, so the pytest loop's shared fixture cannot be handed across.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main_module, "DB_PATH", ":memory:")
+        with TestClient(app) as client:
+            yield client
 
 
 @pytest.fixture
-def client(db: Database) -> TestClient:
-    """Create test client with mocked database."""
-    # Set the global _db directly for WebSocket endpoints
-    original_db = main_module._db
-    main_module._db = db
-    yield TestClient(app)
-    main_module._db = original_db
+def client(session_client: TestClient) -> TestClient:
+    """Return the shared test client, with its database reset."""
+    # Run reset() on the app's own loop, where its database lives
+    session_client.portal.call(main_module.get_db().reset)
+    return session_client
+
+
+def receive(ws: WebSocketTestSession) -> ServerMessage:
+    """Read and validate one message, requiring a text frame as the browser does."""
+    return decoder.validate_json(ws.receive_text())
 
 
 class TestWebSocket:
@@ -32,64 +62,109 @@ class TestWebSocket:
 
     def test_connect_and_receive_balance(self, client: TestClient) -> None:
         with client.websocket_connect("/ws") as ws:
-            data = ws.receive_json()
-            assert data["type"] == "balance_update"
-            assert data["requests_available"] == 0
+            data = receive(ws)
+            assert isinstance(data, BalanceUpdate)
+            assert data.requests_available == 0
 
-    def test_exercise_complete_credits_request(
-        self, client: TestClient, db: Database
-    ) -> None:
+    def test_exercise_complete_credits_request(self, client: TestClient) -> None:
         with client.websocket_connect("/ws") as ws:
             # Receive initial balance
-            ws.receive_json()
+            receive(ws)
 
             # Send exercise complete
-            ws.send_json({
-                "type": "exercise_complete",
-                "exercise": "jumping_jacks",
-                "reps": 20,
-            })
-
-            # Should receive request_awarded
-            awarded = ws.receive_json()
-            assert awarded["type"] == "request_awarded"
-            assert awarded["exercise"] == "jumping_jacks"
-            assert awarded["requests"] == 1
-
-            # Should receive balance_update
-            balance = ws.receive_json()
-            assert balance["type"] == "balance_update"
-            assert balance["requests_available"] == 1
-
-    def test_insufficient_reps_not_credited(
-        self, client: TestClient, db: Database
-    ) -> None:
+            ws.send_text(_PAYLOAD_OK)
+
+            # Should receive the award and new balance in one message
+            result = receive(ws)
+            assert isinstance(result, ExerciseResult)
+            assert result.exercise == "jumping_jacks"
+            assert result.requests == 1
+            assert result.requests_available == 1
+            assert result.requests_earned == 1
+
+    def test_insufficient_reps_not_credited(self, client: TestClient) -> None:
         with client.websocket_connect("/ws") as ws:
-            ws.receive_json()  # Initial balance
+            receive(ws)  # Initial balance
 
             # Send incomplete exercise (only 10 reps, need 20)
-            ws.send_json({
-                "type": "exercise_complete",
-                "exercise": "jumping_jacks",
-                "reps": 10,
-            })
+            ws.send_text(_PAYLOAD_SHORT)
 
             # Should receive error message
-            response = ws.receive_json()
-            assert response["type"] == "error"
-            assert "10" in response["message"]  # Should mention the reps needed
+            response = receive(ws)
+            assert isinstance(response, ErrorMessage)
+            assert "10" in response.message  # Should mention the reps needed
 
-    def test_unknown_exercise_returns_error(
-        self, client: TestClient, db: Database
-    ) -> None:
+    def test_unknown_exercise_returns_error(self, client: TestClient) -> None:
         with client.websocket_connect("/ws") as ws:
-            ws.receive_json()  # Initial balance
+            receive(ws)  # Initial balance
+
+            ws.send_text(_PAYLOAD_UNKNOWN)
+
+            response = receive(ws)
+            assert isinstance(response, ErrorMessage)
+
+    def test_deduct_is_logged_in_history(self, client: TestClient) -> None:
+        client.post("/api/deduct")
+        requests = client.get("/api/history").json()["requests"]
+        assert len(requests) == 1
+        assert requests[0]["blocked"] is True
+
+    def test_disconnect_removes_connection(self, client: TestClient) -> None:
+        with client.websocket_connect("/ws") as ws:
+            receive(ws)
+            assert len(main_module.manager.active_connections) == 1
+        assert not main_module.manager.active_connections
+
+    def test_handler_error_removes_connection(self, client: TestClient) -> None:
+        with pytest.raises(orjson.JSONDecodeError):
+            with client.websocket_connect("/ws") as ws:
+                receive(ws)
+                ws.send_text("not json")
+                receive(ws)
+        assert not main_module.manager.active_connections
+
+
+class FakeWebSocket:
+    """Minimal stand-in recording text frames sent by the manager."""
+
+    def __init__(self, closed: bool = False) -> None:
+        self.closed = closed
+        self.sent: list[str] = []
+
+    async def send_text(self, data: str) -> None:
+        if self.closed:
+            raise RuntimeError("WebSocket is closed")
+        self.sent.append(data)
+
+
+class TestConnectionManager:
+    """Tests for broadcasting balance updates."""
+
+    def test_disconnect_ignores_unknown_connection(self) -> None:
+        manager = ConnectionManager()
+        manager.disconnect(FakeWebSocket())
+        assert not manager.active_connections
+
+    async def test_broadcast_drops_closed_connections(self) -> None:
+        manager = ConnectionManager()
+        open_ws, closed_ws = FakeWebSocket(), FakeWebSocket(closed=True)
+        manager.active_connections.update({open_ws, closed_ws})
+
+        await manager.broadcast_balance(
+            '{"type":"balance_update","requests_available":1}'
+        )
+
+        assert manager.active_connections == {open_ws}
+        assert orjson.loads(open_ws.sent[0])["requests_available"] == 1
+
+    async def test_broadcast_to_single_connection(self) -> None:
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        manager.active_connections.add(ws)
 
-            ws.send_json({
-                "type": "exercise_complete",
-                "exercise": "unknown_exercise",
-                "reps": 20,
-            })
+        await manager.broadcast_balance('{"type":"balance_update"}')
+        assert ws.sent == ['{"type":"balance_update"}']
 
-            response = ws.receive_json()
-            assert response["type"] == "error"
+        ws.closed = True
+        await manager.broadcast_balance('{"type":"balance_update"}')
+        assert not manager.active_connections